@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Demo: fetch one frame and show the thermal/visible images and the
+pseudocolor temperature matrix with its hottest point.
+
+Needs opencv-python and matplotlib on top of the parser's dependencies.
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+import cv2
+from concurrent.futures import ThreadPoolExecutor
+from isapi_tem import extract_global_thermal
+
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+    _tj = TurboJPEG()
+except (ImportError, RuntimeError, OSError):  # PyTurboJPEG/libjpeg-turbo are optional
+    _tj = None
+
+try:
+    import torch
+    from torchvision.io import decode_jpeg, ImageReadMode
+    _HAS_CUDA = torch.cuda.is_available()
+except Exception:  # torch/torchvision are optional, only used with a CUDA GPU
+    _HAS_CUDA = False
+
+def _decode_jpeg(img_bytes):
+    """ Decode JPEG bytes to a BGR image, preferring libjpeg-turbo over cv2 """
+    if _tj is not None:
+        try:
+            return _tj.decode(img_bytes, pixel_format=TJPF_BGR)
+        except Exception:
+            pass  # some JPEGs are rejected by turbojpeg, let OpenCV try
+    return cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+
+def _decode_jpegs_cuda(images):
+    """ Decode a list of JPEG bytes as one nvJPEG batch on the GPU, returns BGR images """
+    tensors = [torch.frombuffer(bytearray(img), dtype=torch.uint8) for img in images]
+    decoded = decode_jpeg(tensors, mode=ImageReadMode.RGB, device='cuda')
+    # CHW RGB tensors -> HWC BGR arrays, as cv2.imdecode would return
+    return [img.flip(0).permute(1, 2, 0).contiguous().cpu().numpy() for img in decoded]
+
+def _decode_jpegs(images):
+    """ Decode a list of JPEG bytes to BGR images, on the GPU when CUDA is available """
+    if _HAS_CUDA:
+        try:
+            return _decode_jpegs_cuda(images)
+        except Exception:
+            pass  # fall back to the CPU decoders
+    # Both CPU decoders release the GIL, so decode the images in parallel
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        return list(pool.map(_decode_jpeg, images))
+
+def main():
+    USR = 'admin'
+    PWD = 'yourpassword'
+    URL = 'http://xxx.xxx.x.xxx'
+
+    # Get images (raw JPEG bytes, no base64 round-trip) and temperature matrix
+    thermal_img, visible_img, temp_list, temp_matrix = extract_global_thermal(USR, PWD, URL, return_bytes=True)
+
+    thermal_cv, visible_cv = _decode_jpegs([thermal_img, visible_img])
+
+    # Display thermal and visible images
+    plt.figure(figsize=(10, 4))
+    plt.subplot(1, 2, 1)
+    plt.title("Thermal Image")
+    plt.imshow(cv2.cvtColor(thermal_cv, cv2.COLOR_BGR2RGB))
+    plt.axis("off")
+
+    plt.subplot(1, 2, 2)
+    plt.title("Visible Image")
+    plt.imshow(cv2.cvtColor(visible_cv, cv2.COLOR_BGR2RGB))
+    plt.axis("off")
+
+    plt.tight_layout()
+    plt.show()
+
+    # Normalize and apply pseudocolor to temperature matrix
+    norm_temp = cv2.normalize(temp_matrix, None, 0, 255, cv2.NORM_MINMAX)
+    norm_temp = norm_temp.astype(np.uint8)
+    color_temp = cv2.applyColorMap(norm_temp, cv2.COLORMAP_JET)
+
+    # Find hottest point
+    max_val = np.max(temp_matrix)
+    max_loc = np.unravel_index(np.argmax(temp_matrix), temp_matrix.shape)
+    y, x = max_loc
+
+    # Display pseudocolor map with hotspot
+    plt.figure(figsize=(5, 4))
+    plt.title("Thermal Matrix (Pseudocolor)")
+    plt.imshow(cv2.cvtColor(color_temp, cv2.COLOR_BGR2RGB))
+    plt.scatter([x], [y], color='white', s=40, marker='o', edgecolors='black')
+    plt.text(x + 5, y - 5, f"{max_val:.1f}°C", color='white', fontsize=10,
+             bbox=dict(facecolor='black', alpha=0.5, boxstyle='round,pad=0.2'))
+    plt.axis("off")
+    plt.tight_layout()
+    plt.show()
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,89 @@
 # -*- coding: utf-8 -*-
 import requests
-import struct
 import numpy as np
-import matplotlib.pyplot as plt
-import cv2
 import json
 from requests.auth import HTTPDigestAuth
-from io import BufferedReader
+from requests.adapters import HTTPAdapter
 from streaming_multipart import MultipartReader
 import re
-import io
+import os
+import threading
 from requests import Response
 import base64
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional, fall back to plain NumPy
+    njit = None
+    prange = range
+
 BOUNDARY = 'boundary'
 
+# Set the ISAPI_DUMP_RAW environment variable to save each raw multipart
+# body here for debugging
+DUMP_RAW_PATH = 'raw_multipart_dump.http'
+
+THERMAL_PATH = '/ISAPI/Thermal/channels/2/thermometry/jpegPicWithAppendData?format=json'
+
+# boundary parameter of the Content-Type header, up to the next parameter
+_BOUNDARY_RE = re.compile(r'boundary=([^;]+)', re.IGNORECASE)
+
+# One keep-alive session per camera user, so polling skips the TCP setup
+# and the Digest challenge round-trip after the first request.
+# Sessions live until close_sessions() is called.
+_SESSION_CACHE = {}
+_SESSION_LOCK = threading.Lock()
+
+def _get_session(USR, PWD, URL):
+    key = (USR, URL)
+    with _SESSION_LOCK:
+        session = _SESSION_CACHE.get(key)
+        if session is not None and session.auth.password != PWD:
+            # Password changed, don't keep authenticating with the old one
+            session.close()
+            session = None
+        if session is None:
+            session = requests.Session()
+            session.auth = HTTPDigestAuth(USR, PWD)
+            session.headers['Connection'] = 'keep-alive'
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _SESSION_CACHE[key] = session
+    return session
+
+def close_sessions():
+    """ Close and forget all cached camera sessions and their connections """
+    with _SESSION_LOCK:
+        sessions = list(_SESSION_CACHE.values())
+        _SESSION_CACHE.clear()
+    for session in sessions:
+        session.close()
+
+def _fetch_thermal(USR, PWD, URL):
+    """ GET the thermal endpoint on the cached session and parse the response (see _parse_thermal_raw) """
+    with _get_session(USR, PWD, URL).get(URL + THERMAL_PATH, stream=True) as response:
+        result = _parse_thermal_raw(response)
+        # Read the rest of the body so the connection goes back to the pool
+        response.raw.drain_conn()
+        response.raw.release_conn()
+    return result
+
+class _TeeStream(object):
+    # Copies everything read from a stream into a second, writable file
+
+    def __init__(self, stream, copy):
+        self._stream = stream
+        self._copy = copy
+
+    def readable(self):
+        return True
+
+    def read(self, n=-1):
+        data = self._stream.read(n)
+        self._copy.write(data)
+        return data
+
 def parse_thermal_response(response: Response):
     """
     Parse ISAPI multipart response to extract thermal image, visible image, and temperature matrix
@@ -28,22 +97,58 @@ def parse_thermal_response(response: Response):
         temp_matrix (np.ndarray): Temperature matrix in Celsius
         width, height: Size of the temperature matrix
     """
+    thermal_img, visible_img, temp_raw, scale, offset, width, height = _parse_thermal_raw(response)
+    temp_matrix = _to_celsius(temp_raw, scale, offset)
+    return thermal_img, visible_img, temp_matrix, width, height
+
+def _to_celsius(temp_raw, scale, offset):
+    """ Converts a _parse_thermal_raw matrix to Celsius (float32 data is returned as is) """
+    if scale is None:
+        return temp_raw
+    # int16 + scale + offset + Kelvin to Celsius
+    # (fused into one output buffer, no full-size temporaries)
+    inv_scale = np.float32(1.0 / scale)
+    bias = np.float32(offset - 273.15)
+    temp_matrix = np.empty(temp_raw.shape, dtype=np.float32)
+    np.multiply(temp_raw, inv_scale, out=temp_matrix, casting='unsafe')
+    np.add(temp_matrix, bias, out=temp_matrix)
+    return temp_matrix
+
+def _parse_thermal_raw(response: Response):
+    """
+    Same as parse_thermal_response, but 16-bit temperature data is left unconverted
+
+    Returns:
+        thermal_img, visible_img, temp_raw, scale, offset, width, height
+        temp_raw is int16 with its scale/offset, or float32 Celsius with scale = offset = None
+    """
     # Extract boundary string
     content_type = response.headers.get("Content-Type", "")
-    match = re.search(r'boundary=(.*)', content_type)
+    match = _BOUNDARY_RE.search(content_type)
     if not match:
         raise ValueError("Boundary not found in Content-Type header")
-    boundary = match.group(1)
-
-    # Read full HTTP body
-    raw_data = response.raw.read()
-
-    # Optional: save raw multipart content for debugging
-    with open("raw_multipart_dump.http", "wb") as f:
-        f.write(raw_data)
-
-    # Construct stream-based multipart parser
-    stream = BufferedReader(io.BytesIO(raw_data))
+    # The boundary may be quoted (RFC 2046)
+    boundary = match.group(1).strip().strip('"')
+
+    # Let urllib3 undo any Content-Encoding while we stream
+    response.raw.decode_content = True
+    stream = response.raw
+
+    # Optional: save raw multipart content for debugging, copied as it streams
+    if os.environ.get("ISAPI_DUMP_RAW"):
+        with open(DUMP_RAW_PATH, "wb") as f:
+            tee = _TeeStream(stream, f)
+            result = _read_thermal_parts(tee, boundary)
+            # Also copy what the parser didn't need (closing boundary, epilogue)
+            while tee.read(64 * 1024):
+                pass
+        return result
+
+    return _read_thermal_parts(stream, boundary)
+
+def _read_thermal_parts(stream, boundary):
+    """ Reads the four parts described in _parse_thermal_raw from a multipart body stream """
+    # Construct stream-based multipart parser directly on the socket stream
     reader = MultipartReader(stream, boundary)
 
     # First part: JSON metadata
@@ -66,163 +171,200 @@ def parse_thermal_response(response: Response):
 
     # Second part: thermal JPEG
     jpeg_part = reader.next_part()
-    thermal_img = jpeg_part.read(jpeg_len)
+    thermal_img = jpeg_part.read(jpeg_len)  # fills up to jpeg_len or the boundary
+    if len(thermal_img) < jpeg_len:
+        raise ValueError("Thermal image truncated: got %d of %d bytes" % (len(thermal_img), jpeg_len))
 
-    # Third part: temperature binary data
+    # Third part: temperature binary data, read straight into one buffer
     temp_part = reader.next_part()
-    temp_data = b""
-    while len(temp_data) < p2p_len:
-        chunk = temp_part.read(p2p_len - len(temp_data))
-        if not chunk:
+    temp_data = bytearray(p2p_len)
+    view = memoryview(temp_data)
+    pos = 0
+    while pos < p2p_len:
+        n = temp_part.readinto(view[pos:])
+        if not n:
             break
-        temp_data += chunk
+        pos += n
+    view.release()
+    if pos < p2p_len:
+        raise ValueError("Temperature data truncated: got %d of %d bytes" % (pos, p2p_len))
 
-    # Convert to Celsius matrix
-    if temp_len == 2:
-        # int16 + scale + offset + Kelvin to Celsius
-        temp_raw = np.frombuffer(temp_data, dtype=np.int16).reshape((height, width))
-        temp_matrix = temp_raw.astype(np.float32) / scale + offset - 273.15
-    else:
-        # float32, already in Celsius
-        temp_matrix = np.frombuffer(temp_data, dtype=np.float32).reshape((height, width))
+    # Temperature matrix, converted to Celsius later by _to_celsius.
+    # Either way it is a view of temp_data (no copy, and the array's .base keeps
+    # the bytearray alive); ISAPI sends little-endian int16 or float32 Celsius
+    dtype = '<i2' if temp_len == 2 else '<f4'
+    temp_raw = np.frombuffer(temp_data, dtype=dtype, count=height * width).reshape((height, width))
 
     # Fourth part: visible-light JPEG
     visible_part = reader.next_part()
     visible_img = visible_part.read()
 
-    return thermal_img, visible_img, temp_matrix, width, height
+    return thermal_img, visible_img, temp_raw, scale, offset, width, height
+
+def _temp_stats_kernel(arr):
+    """
+    One pass over a 2-D temperature array.
+
+    Returns:
+        (min, min_idx, max, max_idx, mean), indices flattened row-major
+    """
+    h, w = arr.shape
+    if h == 0 or w == 0:
+        raise ValueError("zero-size temperature region")
+    mn = mx = arr[0, 0]
+    mn_idx = mx_idx = 0
+    total = 0.0
+    for i in range(h):
+        for j in range(w):
+            v = arr[i, j]
+            total += v
+            if v < mn:
+                mn = v
+                mn_idx = i * w + j
+            if v > mx:
+                mx = v
+                mx_idx = i * w + j
+    return mn, mn_idx, mx, mx_idx, total / (h * w)
+
+def _temp_stats_numpy(arr):
+    mn_idx = int(np.argmin(arr))
+    mx_idx = int(np.argmax(arr))
+    w = arr.shape[1]
+    return arr[divmod(mn_idx, w)], mn_idx, arr[divmod(mx_idx, w)], mx_idx, arr.mean()
+
+if njit is not None:
+    _temp_stats = njit(fastmath=True, cache=True)(_temp_stats_kernel)
+else:
+    _temp_stats = _temp_stats_numpy
+
+def _region_stats_kernel(temp, regions, out):
+    """
+    Fills out[r] with [max, x, y, min, x, y, mean] for every
+    regions[r] = [x1, y1, x2, y2]; regions are processed in parallel.
+    """
+    for r in prange(regions.shape[0]):
+        x1 = regions[r, 0]
+        y1 = regions[r, 1]
+        x2 = regions[r, 2]
+        y2 = regions[r, 3]
+        mn, mn_idx, mx, mx_idx, mean = _temp_stats(temp[y1:y2, x1:x2])
+        w = x2 - x1
+        out[r, 0] = mx
+        out[r, 1] = mx_idx % w
+        out[r, 2] = mx_idx // w
+        out[r, 3] = mn
+        out[r, 4] = mn_idx % w
+        out[r, 5] = mn_idx // w
+        out[r, 6] = mean
+
+if njit is not None:
+    _region_stats = njit(parallel=True, cache=True)(_region_stats_kernel)
+else:
+    _region_stats = _region_stats_kernel
+
+def _summarize(temp):
+    """ Returns [max_temp, x, y, min_temp, x, y, mean_temp] for a 2-D temperature array """
+    min_temp, min_idx, max_temp, max_idx, mean_temp = _temp_stats(temp)
+    max_y, max_x = divmod(max_idx, temp.shape[1])
+    min_y, min_x = divmod(min_idx, temp.shape[1])
+    return [max_temp, max_x, max_y, min_temp, min_x, min_y, mean_temp]
+
+def _as_region_array(rows):
+    """ Returns rows of 4 integers as an int64 (N, 4) array, ValueError for any other shape """
+    if len(rows) == 0:
+        return np.empty((0, 4), dtype=np.int64)
+    regions = np.asarray(rows, dtype=np.int64)
+    if regions.ndim != 2 or regions.shape[1] != 4:
+        raise ValueError("Each region must have exactly 4 values")
+    return regions
+
+def _summarize_regions(temp, bounds, scale=None, offset=None):
+    """
+    Returns one [max_temp, x, y, min_temp, x, y, mean_temp] per (x1, y1, x2, y2) in bounds
 
-def extract_global_thermal(USR, PWD, URL):
+    With scale/offset, temp is the raw int16 matrix: stats are taken on the raw
+    values and only the reported temperatures are converted to Celsius.
+    """
+    regions = _as_region_array(bounds)
+    if np.any((regions[:, :2] < 0) | (regions[:, 2:] <= regions[:, :2])):
+        raise ValueError("Invalid or empty temperature region")
+    # Checked non-negative here and clipped to the matrix by the caller
+    regions = regions.astype(np.int32)
+    out = np.empty((len(regions), 7), dtype=np.float64)
+    _region_stats(temp, regions, out)
+    if scale is not None:
+        out[:, [0, 3, 6]] = out[:, [0, 3, 6]] / scale + (offset - 273.15)
+    return [[row[0], int(row[1]), int(row[2]), row[3], int(row[4]), int(row[5]), row[6]]
+            for row in out.tolist()]
+
+def extract_global_thermal(USR, PWD, URL, return_bytes=False):
     """
     Get full-frame thermal/visible images and global temperature data
 
     Args:
         USR, PWD: Camera login credentials
         URL: Camera base address (e.g. http://192.168.1.122)
+        return_bytes: Return raw JPEG bytes instead of base64 strings
 
     Returns:
-        thermal_b64: Base64 of thermal image
-        visible_b64: Base64 of visible image
+        thermal_b64: Base64 of thermal image (JPEG bytes if return_bytes)
+        visible_b64: Base64 of visible image (JPEG bytes if return_bytes)
         global_temp: [max_temp, x, y, min_temp, x, y, mean_temp]
         temp_matrix: Celsius temperature matrix
     """
-    url = f'{URL}/ISAPI/Thermal/channels/2/thermometry/jpegPicWithAppendData?format=json'
-    session = requests.Session()
-    session.auth = HTTPDigestAuth(USR, PWD)
-    response = session.get(url, stream=True)
+    thermal_img, visible_img, temp_raw, scale, offset, temp_width, temp_height = _fetch_thermal(USR, PWD, URL)
+    temp_matrix = _to_celsius(temp_raw, scale, offset)
+
+    # Temperature statistics
+    global_temp = _summarize(temp_matrix)
 
-    thermal_img, visible_img, temp_matrix, temp_width, temp_height = parse_thermal_response(response)
+    if return_bytes:
+        return thermal_img, visible_img, global_temp, temp_matrix
 
     # Encode images to base64
     thermal_b64 = base64.b64encode(thermal_img).decode('utf-8')
     visible_b64 = base64.b64encode(visible_img).decode('utf-8')
 
-    # Temperature statistics
-    max_temp = temp_matrix.max()
-    min_temp = temp_matrix.min()
-    mean_temp = temp_matrix.mean()
-
-    max_pos = np.unravel_index(np.argmax(temp_matrix), temp_matrix.shape)
-    min_pos = np.unravel_index(np.argmin(temp_matrix), temp_matrix.shape)
-
-    global_temp = [max_temp, max_pos[1], max_pos[0], min_temp, min_pos[1], min_pos[0], mean_temp]
-
     return thermal_b64, visible_b64, global_temp, temp_matrix
 
-def extract_region_thermal(USR, PWD, URL, region_list):
+def extract_region_thermal(USR, PWD, URL, region_list, return_bytes=False):
     """
     Get temperature data in specified regions
 
     Args:
         region_list: [(x, y, w, h), ...] format
+        return_bytes: Return raw JPEG bytes instead of base64 strings
 
     Returns:
-        Base64-encoded images and region-wise temperature stats
+        Base64-encoded images (JPEG bytes if return_bytes) and region-wise temperature stats
     """
-    url = f'{URL}/ISAPI/Thermal/channels/2/thermometry/jpegPicWithAppendData?format=json'
-    session = requests.Session()
-    session.auth = HTTPDigestAuth(USR, PWD)
-    response = session.get(url, stream=True)
+    # Regions only need a few reported values, so int16 data is not converted
+    # to a full Celsius matrix here
+    thermal_img, visible_img, temp_raw, scale, offset, temp_width, temp_height = _fetch_thermal(USR, PWD, URL)
 
-    thermal_img, visible_img, temp_matrix, temp_width, temp_height = parse_thermal_response(response)
+    # Columns x, y, w, h for all regions at once; skip regions starting
+    # outside the matrix and clip the rest to its size (in int64, so a huge
+    # "to the edge" width can't overflow)
+    regions = _as_region_array(region_list)
+    regions = regions[(regions[:, 0] < temp_width) & (regions[:, 1] < temp_height)]
 
-    thermal_b64 = base64.b64encode(thermal_img).decode('utf-8')
-    visible_b64 = base64.b64encode(visible_img).decode('utf-8')
-
-    region_temp_list = []
-
-    for region in region_list:
-        region_x1, region_y1, region_w, region_h = region
-        if region_x1 >= temp_width or region_y1 >= temp_height:
-            continue
-
-        region_x2 = min(region_x1 + region_w, temp_width)
-        region_y2 = min(region_y1 + region_h, temp_height)
+    region_bounds = np.empty_like(regions)
+    region_bounds[:, :2] = regions[:, :2]
+    region_bounds[:, 2] = np.minimum(regions[:, 0] + regions[:, 2], temp_width)
+    region_bounds[:, 3] = np.minimum(regions[:, 1] + regions[:, 3], temp_height)
 
-        temp_region = temp_matrix[region_y1:region_y2, region_x1:region_x2]
+    # Stats for all regions in one batched (parallel with numba) call
+    region_temp_list = _summarize_regions(temp_raw, region_bounds, scale, offset)
 
-        max_temp = temp_region.max()
-        min_temp = temp_region.min()
-        mean_temp = temp_region.mean()
+    if return_bytes:
+        return thermal_img, visible_img, region_temp_list
 
-        max_pos = np.unravel_index(np.argmax(temp_region), temp_region.shape)
-        min_pos = np.unravel_index(np.argmin(temp_region), temp_region.shape)
-
-        temp_result = [max_temp, max_pos[1], max_pos[0], min_temp, min_pos[1], min_pos[0], mean_temp]
-        region_temp_list.append(temp_result)
+    thermal_b64 = base64.b64encode(thermal_img).decode('utf-8')
+    visible_b64 = base64.b64encode(visible_img).decode('utf-8')
 
     return thermal_b64, visible_b64, region_temp_list
 
-def main():
-    USR = 'admin'
-    PWD = 'yourpassword'
-    URL = 'http://xxx.xxx.x.xxx'
-
-    # Get images and temperature matrix
-    thermal_img, visible_img, temp_list, temp_matrix = extract_global_thermal(USR, PWD, URL)
-
-    # Decode base64 image bytes
-    thermal_img_bytes = base64.b64decode(thermal_img)
-    visible_img_bytes = base64.b64decode(visible_img)
-
-    thermal_cv = cv2.imdecode(np.frombuffer(thermal_img_bytes, np.uint8), cv2.IMREAD_COLOR)
-    visible_cv = cv2.imdecode(np.frombuffer(visible_img_bytes, np.uint8), cv2.IMREAD_COLOR)
-
-    # Display thermal and visible images
-    plt.figure(figsize=(10, 4))
-    plt.subplot(1, 2, 1)
-    plt.title("Thermal Image")
-    plt.imshow(cv2.cvtColor(thermal_cv, cv2.COLOR_BGR2RGB))
-    plt.axis("off")
-
-    plt.subplot(1, 2, 2)
-    plt.title("Visible Image")
-    plt.imshow(cv2.cvtColor(visible_cv, cv2.COLOR_BGR2RGB))
-    plt.axis("off")
-
-    plt.tight_layout()
-    plt.show()
-
-    # Normalize and apply pseudocolor to temperature matrix
-    norm_temp = cv2.normalize(temp_matrix, None, 0, 255, cv2.NORM_MINMAX)
-    norm_temp = norm_temp.astype(np.uint8)
-    color_temp = cv2.applyColorMap(norm_temp, cv2.COLORMAP_JET)
-
-    # Find hottest point
-    max_val = np.max(temp_matrix)
-    max_loc = np.unravel_index(np.argmax(temp_matrix), temp_matrix.shape)
-    y, x = max_loc
-
-    # Display pseudocolor map with hotspot
-    plt.figure(figsize=(5, 4))
-    plt.title("Thermal Matrix (Pseudocolor)")
-    plt.imshow(cv2.cvtColor(color_temp, cv2.COLOR_BGR2RGB))
-    plt.scatter([x], [y], color='white', s=40, marker='o', edgecolors='black')
-    plt.text(x + 5, y - 5, f"{max_val:.1f}°C", color='white', fontsize=10,
-             bbox=dict(facecolor='black', alpha=0.5, boxstyle='round,pad=0.2'))
-    plt.axis("off")
-    plt.tight_layout()
-    plt.show()
-
 if __name__ == "__main__":
+    # Visualization lives in demo.py so importing this module stays NumPy-only
+    from demo import main
     main()
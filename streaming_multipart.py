@@ -7,17 +7,18 @@ contents aren't cached to a file, or stored in memory.
 
 https://github.com/rckclmbr/streaming_multipart
 """
-import requests
+import re
 from io import BufferedReader
-from cgi import parse_header
-from mimetypes import MimeTypes
-from email.parser import Parser
-from io import StringIO
-import hashlib
 
 __version__ = "1.0"
 
-BLOCK_SIZE = 4096
+# Sized for multi-MB temperature parts, so a part takes a handful of
+# round-trips through _PartReader rather than thousands
+BLOCK_SIZE = 1 << 18
+READ_BUFFER_SIZE = 1 << 20
+
+# key=value or key="quoted value" parameters of a header such as Content-Disposition
+_PARAM_RE = re.compile(r'([^=;\s]+)\s*=\s*("([^"]*)"|[^;]*)')
 
 def _new_part(mr):
     bp = Part(mr)
@@ -33,24 +34,45 @@ def skipLWSPChar(b):
 
 
 class _Buff:
-    # A simple read buffer (Python 3 version)
+    # A simple read buffer (Python 3 version), bytes-like data only
+    # Data is appended to one bytearray and consumed from self.pos, so
+    # buffering a large part doesn't re-copy everything already pending.
 
     def __init__(self, st=b""):  # 注意用 bytes 而不是 str
-        if isinstance(st, str):
-            st = st.encode()  # 自动编码
-        self.buf = memoryview(st)
+        self.buf = bytearray(st)
+        self.pos = 0
+
+    def extend(self, data):
+        self.buf += data
 
     def read(self, n=None):
         if n is None:
-            ret = self.buf.tobytes()
-            self.buf = memoryview(b"")
+            ret = bytes(self.buf[self.pos:])
+            del self.buf[:]
+            self.pos = 0
             return ret
-        ret = self.buf[:n].tobytes()
-        self.buf = self.buf[n:]
+        end = self.pos + n
+        ret = bytes(self.buf[self.pos:end])
+        self._advance(len(ret))
         return ret
 
+    def readinto(self, b):
+        """ Copies up to len(b) buffered bytes straight into the writable buffer b """
+        n = min(len(b), len(self))
+        with memoryview(self.buf) as mv:
+            b[:n] = mv[self.pos:self.pos + n]
+        self._advance(n)
+        return n
+
+    def _advance(self, n):
+        self.pos += n
+        # Reclaim the consumed prefix once it dominates the buffer
+        if self.pos > len(self.buf) // 2:
+            del self.buf[:self.pos]
+            self.pos = 0
+
     def __len__(self):
-        return len(self.buf)
+        return len(self.buf) - self.pos
 
 
 
@@ -69,16 +91,12 @@ class _StreamWrapper(object):
             return self._wrapped.readinto(b)
 
         size = len(b)
-        # print "readinto", size
         buf = self._wrapped.read(size)
         if not buf:
-            return
-        if len(buf) == 0:
-            return None
-        for i, c in enumerate(buf):
-            b[i] = c
-        # print len(b.tobytes())
-        return len(buf)
+            return 0
+        n = len(buf)
+        memoryview(b)[:n] = buf
+        return n
 
     def __init__(self, wrapped):
         self._wrapped = wrapped
@@ -97,52 +115,125 @@ class _PartReader(object):
         """
         Reads the body of the part, up to and including length "d".
         """
-        n = ""
         p = self.p
-        try:
-            # If the buffer contains the length of data we need, just return it
-            if len(p.buf) >= d:
-                #print "Buffer has size %d, just reading %d bytes" % (len(p.buf), d)
-                return p.buf.read(d)
-            #print "Peeking %s from BufferedReader" % BLOCK_SIZE
-            peek = p.mr.buf_reader.peek(BLOCK_SIZE)
-            #print "length of peek:", len(peek), hashlib.md5(peek).hexdigest()
-
-            if p.bytes_read == 0 and p.mr.peek_buffer_is_empty_part(peek):
-                return "" # EOF
-
-            # * Search for the boundary.  If it exists, return all bytes up to
-            #   the boundary.
-            # * Only actually read up to bytes_in_buffer - sizeof(boundary),
-            #   leaving a tail for the boundary check
-            n_copy = 0
-            found_boundary = False
-            idx = peek.find(p.mr.dash_boundary)
-            safe_count = len(peek) - len(p.mr.dash_boundary)
+        while len(p.buf) < d and not p.eof:
+            self._fill()
+        n = p.buf.read(d)
+        p.bytes_read += len(n)
+        return n
+
+    def readinto(self, b):
+        """
+        Copies the next available bytes of the part into the writable buffer
+        b and returns how many, 0 once the part is finished.  Like a raw read
+        this may return fewer than len(b) bytes; callers loop.
+
+        Data not already in the part buffer is copied from the BufferedReader
+        straight into b, so large parts aren't staged in p.buf first.
+        """
+        p = self.p
+        while len(p.buf) == 0 and not p.eof:
+            if p.tail:
+                if not self._release_tail():
+                    self._fill()
+                continue
+            n = self._readinto_direct(b)
+            if n:
+                p.bytes_read += n
+                return n
+            self._fill()
+        n = p.buf.readinto(b)
+        p.bytes_read += n
+        return n
+
+    def _readinto_direct(self, b):
+        """
+        Reads the boundary-free head of the BufferedReader into b, keeping
+        back len(boundary) - 1 bytes.  Returns 0 when there is nothing safe to
+        copy (boundary at the front, or too little buffered) so _fill decides.
+        """
+        mr = self.p.mr
+        db = mr.dash_boundary
+        peek = mr.buf_reader.peek(mr.block_size)
+        idx = peek.find(db)
+        safe = idx if idx != -1 else len(peek) - (len(db) - 1)
+        n = min(safe, len(b))
+        if n <= 0:
+            return 0
+        return mr.buf_reader.readinto(b[:n])
+
+    def _release_tail(self):
+        """
+        Moves the held-back p.tail into the part buffer if the next block
+        proves no boundary starts in it.  Returns False if it can't tell yet.
+        """
+        p = self.p
+        db = p.mr.dash_boundary
+        keep = len(db) - 1
+        peek = p.mr.buf_reader.peek(p.mr.block_size)
+        if len(peek) < keep or (p.tail + peek[:keep]).find(db) != -1:
+            return False
+        p.buf.extend(p.tail)
+        p.tail = b""
+        return True
 
+    def _fill(self):
+        """
+        Moves the next block of the stream into the part buffer, stopping at
+        the boundary.
+
+        Every peeked block is consumed whole, so each byte is searched once.
+        The last len(boundary) - 1 bytes are held back in p.tail because they
+        may be the start of a boundary split across two blocks; they are
+        searched again together with the head of the next block.
+        """
+        p = self.p
+        mr = p.mr
+        db = mr.dash_boundary
+        keep = len(db) - 1
+
+        peek = mr.buf_reader.peek(mr.block_size)
+        if not peek:
+            # Stream ended without a closing boundary
+            p.buf.extend(p.tail)
+            p.tail = b""
+            p.eof = True
+            return
+
+        # * Search for the boundary.  If it exists, the part ends right
+        #   before it.
+        idx = -1
+        if p.tail:
+            idx = (p.tail + peek[:keep]).find(db)
+        if idx == -1:
+            idx = peek.find(db)
             if idx != -1:
-                n_copy = idx
-                found_boundary = True
-            elif safe_count > 0:
-                n_copy = safe_count
-            elif idx == -1 and safe_count == 0:
-                # When the data isn't a boundary, but has the same length as the
-                # boundary, read more off the BufferedReader
-                #print "Reading %d bytes from BufferedReader into buffer" % n_copy
-                data = p.mr.buf_reader.read(len(peek))
-                p.buf = _Buff(p.buf.read() + data)
-
-            if n_copy > 0:
-                #print "Reading %d bytes from BufferedReader into buffer" % n_copy
-                data = p.mr.buf_reader.read(n_copy)
-                p.buf = _Buff(p.buf.read() + data)
-
-            #print "Reading %s bytes from buffer of size %s" % (d, len(p.buf))
-            n = p.buf.read(d)
-            return n
-        finally:
-            if n is not None:
-                p.bytes_read += len(n)
+                idx += len(p.tail)
+
+        if idx != -1:
+            if idx < len(p.tail):
+                # Boundary starts inside the tail we already consumed, hand
+                # those bytes back so next_part() can see the whole line
+                p.buf.extend(p.tail[:idx])
+                mr.pushback = p.tail[idx:]
+            else:
+                p.buf.extend(p.tail)
+                p.buf.extend(mr.buf_reader.read(idx - len(p.tail)))
+            p.tail = b""
+            p.eof = True
+            return
+
+        # * No boundary, keep everything except a possible partial boundary
+        data = mr.buf_reader.read(len(peek))
+        if len(data) >= keep:
+            p.buf.extend(p.tail)
+            p.buf.extend(memoryview(data)[:len(data) - keep])
+            p.tail = data[len(data) - keep:]
+        else:
+            tail = p.tail + data
+            cut = max(len(tail) - keep, 0)
+            p.buf.extend(tail[:cut])
+            p.tail = tail[cut:]
 
 
 class MultipartReader(object):
@@ -159,11 +250,19 @@ class MultipartReader(object):
     data = part1.read(1024)
     """
 
-    def __init__(self, stream, boundary=None):
+    def __init__(self, stream, boundary=None, block_size=BLOCK_SIZE, buffer_size=READ_BUFFER_SIZE):
+        """
+        stream may be any readable binary file-like object (a file, BytesIO,
+        or an urllib3 response such as requests' response.raw).
+
+        block_size is how much is peeked and searched for the boundary at a
+        time, buffer_size the size of the underlying BufferedReader.
+        """
         b = b"\r\n--" + boundary.encode("utf-8") + b"--"  # 保证是 bytes
 
         stream = _StreamWrapper(stream)  # 包装原始流
-        self.buf_reader = BufferedReader(stream)  # ✅ 关键初始化
+        self.buf_reader = BufferedReader(stream, buffer_size=buffer_size)
+        self.block_size = block_size
 
         self.nl = b[:2]
         self.nl_dash_boundary = b[:len(b)-2]
@@ -173,6 +272,7 @@ class MultipartReader(object):
         self.headers = {}
         self.parts_read = 0
         self.current_part = None
+        self.pushback = b""  # start of a boundary line already read by a Part
 
     def iter_parts(self):
         """
@@ -198,7 +298,7 @@ class MultipartReader(object):
 
         expect_new_part = False
         while True:
-            line = self.buf_reader.readline()
+            line = self._readline()
             try:
                 is_EOF = self.buf_reader.peek(1)
             except(ValueError):
@@ -228,6 +328,13 @@ class MultipartReader(object):
 
             raise Exception("Unexpected line in next_part(): %s" % line)
 
+    def _readline(self):
+        line = self.buf_reader.readline()
+        if self.pushback:
+            line = self.pushback + line
+            self.pushback = b""
+        return line
+
     def is_final_boundary(self, line):
         if not line.startswith(self.dash_boundary_dash):
             return False
@@ -250,19 +357,6 @@ class MultipartReader(object):
         # if not line.endswith(self.dash_boundary_nl):
         #     return False
 
-    def peek_buffer_is_empty_part(self, peek):
-        if peek.startswith(self.dash_boundary_dash):
-            rest = peek[len(self.dash_boundary_dash):]
-            rest = skipLWSPChar(rest)
-            return rest.startswith(self.nl) or len(rest) == 0
-
-        if not peek.startswith(self.dash_boundary):
-            return False
-
-        rest = peek[len(self.dash_boundary):]
-        rest = skipLWSPChar(rest)
-        return rest.startswith(self.nl)
-
 
 class Part(object):
     """
@@ -274,6 +368,8 @@ class Part(object):
         self.buf = _Buff()          # Buffer
         self.mr = mr               # Reader
         self.r = _PartReader(self) # PartReader
+        self.tail = b""            # Bytes that may start the boundary
+        self.eof = False           # Boundary reached
         self.bytes_read = 0
         self.disposition = ""
         self.disposition_params = {}
@@ -283,23 +379,26 @@ class Part(object):
     def close(self):
         """ Flushes the stream to the end of the part, so the next one can be started """
         while True:
-            chunk = self.read(BLOCK_SIZE)
+            chunk = self.read(self.mr.block_size)
             if not chunk or len(chunk) == 0:
                 break
         self.closed = True
 
     def populate_headers(self):
-        header_lines = []
+        """ Reads "Key: value" lines up to the blank line; keys are stored lower-cased """
+        key = None
         while True:
             line = self.mr.buf_reader.readline()
             if line in (b"\r\n", b"\n", b""):  # 结束标志
                 break
-            header_lines.append(line.decode("utf-8", errors="ignore"))
-
-        # 将 header_lines 拼接为一个完整字符串
-        header_text = "".join(header_lines)
-        msg = Parser().parsestr(header_text)
-        self.headers.update(dict(msg.items()))
+            if line[:1] in (b" ", b"\t") and key is not None:
+                # Folded continuation of the previous header
+                value = line.strip().decode("utf-8", errors="ignore")
+                self.headers[key] = (self.headers[key] + " " + value).strip()
+                continue
+            k, _, v = line.partition(b":")
+            key = k.strip().lower().decode("utf-8", errors="ignore")
+            self.headers[key] = v.strip().decode("utf-8", errors="ignore")
 
     def form_name(self):
         """ Returns the name of the element, as used in a form"""
@@ -317,24 +416,30 @@ class Part(object):
     def _parse_content_disposition(self):
         if "content-disposition" in self.headers:
             v = self.headers["content-disposition"]
-            params = parse_header(v)
-            key, values = params
-            self.disposition_params.update(values)
+            for m in _PARAM_RE.finditer(v):
+                value = m.group(3) if m.group(3) is not None else m.group(2).strip()
+                self.disposition_params[m.group(1).lower()] = value
 
     def read(self, d=None):
         if self.closed:
             raise IOError("Part already closed")
         if d is None:
-            data = b""
+            data = bytearray()
             while True:
-                chunk = self.r.read(BLOCK_SIZE)
+                chunk = self.r.read(self.mr.block_size)
                 if not chunk or len(chunk) == 0:
                     break
                 data += chunk
-            return data
+            return bytes(data)
         else:
             return self.r.read(d)
 
+    def readinto(self, b):
+        """ Reads the part into a pre-allocated writable buffer, like io.RawIOBase.readinto """
+        if self.closed:
+            raise IOError("Part already closed")
+        return self.r.readinto(memoryview(b).cast("B"))
+
     def readline(self):
         raise NotImplementedError()
 